@@ -3,12 +3,17 @@ import sys
 import json
 import subprocess
 import datetime
+import hashlib
 import traceback
 import threading
 import queue
 import re
+import select
 import shutil
+import time
 import importlib
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from shutil import which
 
 import tkinter as tk
@@ -17,6 +22,7 @@ from tkinter import ttk, filedialog, messagebox
 # ========= Global Config / Defaults =========
 LOG_NAME = "log.txt"
 PROGRESS_DB_NAME = "progress.json"
+PROGRESS_JOURNAL_NAME = "progress.jsonl"
 FAILED_LIST_NAME = "failed.txt"
 
 # Supported inputs
@@ -25,16 +31,43 @@ INPUT_EXTS = {".mkv", ".webm", ".ogv"}
 # MKV policy: remux; audio copy if AAC/MP3 else AAC transcode
 AUDIO_OK_FOR_MP4 = {"aac", "mp3"}
 
+# WEBM/OGV whose video is already one of these (and audio MP4-ready) are remuxed, not transcoded
+VIDEO_OK_FOR_MP4 = {"h264"}
+
 # WEBM/OGV defaults (quality-first)
 DEFAULT_CRF = "18"         # lower = higher quality (18 ≈ visually lossless)
 DEFAULT_PRESET = "slow"    # slower = better compression at same quality
 DEFAULT_TUNE = ""          # "film", "animation", "grain" (empty = none)
+DEFAULT_ENCODER = "libx264"   # "auto" = first hardware H.264 encoder that passes a test encode, else libx264
 AUDIO_BITRATE = "192k"     # AAC bitrate
+
+# ffmpeg stderr streaming: read size and batching of log/UI flushes
+STDERR_CHUNK = 65536
+LOG_FLUSH_INTERVAL = 0.2   # seconds between batched flushes
+LOG_FLUSH_LINES = 64       # ...or flush earlier once this many lines are pending
+
+# Worker -> GUI queue: bounded so a fast ffmpeg can't outrun the Tk poll loop
+UI_QUEUE_MAX = 2000
+UI_DRAIN_PER_TICK = 500    # max queue items handled per poll_queue tick
+
+# Log view keeps at most this many lines, dropping the oldest block (log.txt has everything)
+LOG_VIEW_MAX_LINES = 5000
+LOG_VIEW_TRIM_LINES = 1000
+
+# Files converted concurrently (each runs its own ffmpeg)
+DEFAULT_PARALLELISM = max(1, (os.cpu_count() or 2) // 2)
+
+# Fold progress.jsonl into progress.json after this many journal lines (and at end of run)
+PROGRESS_COMPACT_EVERY = 500
+
+# Bytes hashed from each end of a source for its content fingerprint
+FINGERPRINT_CHUNK = 1 << 20
 # ===========================================
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 LOG_FILE = os.path.join(SCRIPT_DIR, LOG_NAME)
 PROGRESS_DB_FILE = os.path.join(SCRIPT_DIR, PROGRESS_DB_NAME)
+PROGRESS_JOURNAL_FILE = os.path.join(SCRIPT_DIR, PROGRESS_JOURNAL_NAME)
 FAILED_LIST_FILE = os.path.join(SCRIPT_DIR, FAILED_LIST_NAME)
 
 # ---------- FFmpeg/ffprobe resolution (no system install required) ----------
@@ -83,6 +116,12 @@ def resolve_media_bins():
 
 FFMPEG_BIN, FFPROBE_BIN = resolve_media_bins()
 
+# Optional PyAV (libavformat bindings): probe in-process instead of spawning ffprobe
+try:
+    import av  # type: ignore
+except Exception:
+    av = None
+
 # ---------- Resource helper (works in PyInstaller one-file) ----------
 def resource_path(rel_path: str) -> str:
     """Return absolute path to resource, works for dev and PyInstaller one-file."""
@@ -93,17 +132,77 @@ def resource_path(rel_path: str) -> str:
 def nowstamp():
     return datetime.datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
 
-def ui_safe_log(ui_queue, msg, also_file=True):
-    ui_queue.put(("log", msg))
+class LogWriter:
+    """
+    Shared append handle for a text log (log.txt, failed.txt). Inside a session
+    (`with LOG:`) the first write opens one buffered handle that is kept until
+    the session ends and flushed every `flush_interval` seconds (by the next
+    write, or by `flush_if_due()` while idle); outside a session each write
+    opens, appends and closes the file as before. Thread-safe.
+    """
+    def __init__(self, path, flush_interval=1.0, buffering=1 << 16):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.buffering = buffering
+        self._lock = threading.Lock()
+        self._fh = None
+        self._users = 0
+        self._last_flush = 0.0
+
+    def __enter__(self):
+        with self._lock:
+            self._users += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self._users -= 1
+            if self._users == 0 and self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    def write(self, text):
+        with self._lock:
+            if self._users == 0:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(text)
+                return
+            if self._fh is None:
+                self._fh = open(self.path, "a", encoding="utf-8", buffering=self.buffering)
+                self._last_flush = time.monotonic()
+            self._fh.write(text)
+            self._flush_if_due()
+
+    def flush_if_due(self):
+        """Flush the session handle if `flush_interval` has passed since the last flush."""
+        with self._lock:
+            self._flush_if_due()
+
+    def _flush_if_due(self):
+        if self._fh is None:
+            return
+        now = time.monotonic()
+        if now - self._last_flush >= self.flush_interval:
+            self._fh.flush()
+            self._last_flush = now
+
+LOG = LogWriter(LOG_FILE)
+# Failures are rare and must survive the window being closed mid-run: flush each one
+FAILED = LogWriter(FAILED_LIST_FILE, flush_interval=0, buffering=1 << 14)
+
+def ui_safe_log(ui_queue, msg, also_file=True, block=True):
+    # block=False is for the Tk thread, which must never wait on its own queue
+    try:
+        ui_queue.put(("log", msg), block=block)
+    except queue.Full:
+        pass
     if also_file:
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(f"{nowstamp()} {msg}\n")
+        LOG.write(f"{nowstamp()} {msg}\n")
 
 def ui_safe_log_raw(ui_queue, raw):
     # raw already includes newlines; no timestamp here
     ui_queue.put(("lograw", raw))
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(raw)
+    LOG.write(raw)
 
 def load_json(path):
     try:
@@ -113,51 +212,193 @@ def load_json(path):
         return {}
 
 def save_json(path, data):
+    """Atomic, durable write: temp file + fsync, os.replace, then fsync the directory (POSIX)."""
     tmp = path + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    with open(tmp, "w", encoding="utf-8", buffering=1 << 20) as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
     os.replace(tmp, path)
+    if os.name == "posix":
+        # Persist the rename itself (best effort: some FUSE/CIFS mounts refuse
+        # a directory fsync); Windows can't open directories this way
+        try:
+            dfd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+            try:
+                os.fsync(dfd)
+            finally:
+                os.close(dfd)
+        except OSError:
+            pass
+
+class ProgressJournal:
+    """
+    Progress DB = progress.json snapshot + append-only progress.jsonl journal.
+    Every update appends one line ({"src": ..., **record}); load() replays the
+    journal over the snapshot (last writer wins, torn lines are ignored) and
+    compact() folds it all into a fresh snapshot and empties the journal.
+    """
+    def __init__(self, snapshot_path, journal_path):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.pending = 0  # journal lines not yet folded into the snapshot
+        self._fh = None
+
+    def load(self):
+        db = load_json(self.snapshot_path)
+        self.pending = 0
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                        src = rec.pop("src")
+                    except Exception:
+                        continue
+                    db[src] = rec
+                    self.pending += 1
+        except FileNotFoundError:
+            pass
+        return db
+
+    def __enter__(self):
+        torn = False
+        try:
+            with open(self.journal_path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell():
+                    f.seek(-1, os.SEEK_END)
+                    torn = f.read(1) != b"\n"
+        except FileNotFoundError:
+            pass
+        self._fh = open(self.journal_path, "a", encoding="utf-8")
+        if torn:
+            # Terminate a half-written last line so the next record parses
+            self._fh.write("\n")
+        return self
+
+    def __exit__(self, *exc):
+        self._fh.close()
+        self._fh = None
+
+    def append(self, src, rec):
+        self._fh.write(json.dumps({"src": src, **rec}, ensure_ascii=False, separators=(",", ":")) + "\n")
+        self._fh.flush()
+        self.pending += 1
+
+    def compact(self, db):
+        save_json(self.snapshot_path, db)
+        if self._fh is not None:
+            self._fh.seek(0)
+            self._fh.truncate()
+        else:
+            open(self.journal_path, "w", encoding="utf-8").close()
+        self.pending = 0
 
 def append_failed(path):
-    with open(FAILED_LIST_FILE, "a", encoding="utf-8") as f:
-        f.write(path + "\n")
+    # Kept open (flushed per line) while a conversion run holds FAILED, otherwise a one-off append
+    FAILED.write(path + "\n")
 
-def file_sig(path):
+def file_sig(path, cache=None):
+    """(size, mtime_ns) of `path`; with `cache` (a per-run dict) each path is stat()ed once."""
+    if cache is not None and path in cache:
+        return cache[path]
     st = os.stat(path)
-    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    sig = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if cache is not None:
+        cache[path] = sig
+    return sig
+
+def output_ok(path):
+    """True if `path` exists and is non-empty (one stat)."""
+    try:
+        return os.stat(path).st_size > 0
+    except OSError:
+        return False
+
+def file_fingerprint(path):
+    """Cheap content fingerprint: size + blake2b of the first and last FINGERPRINT_CHUNK bytes."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        head = hashlib.blake2b(f.read(FINGERPRINT_CHUNK), digest_size=16).hexdigest()
+        f.seek(max(0, size - FINGERPRINT_CHUNK))
+        tail = hashlib.blake2b(f.read(FINGERPRINT_CHUNK), digest_size=16).hexdigest()
+    return {"size": size, "head": head, "tail": tail}
 
-def already_done(db, src, dst):
+def already_done(db, src, dst, sig_cache=None, journal=None):
+    """
+    True if `src` still matches what was converted: a matching (size, mtime_ns)
+    short-circuits, otherwise the content fingerprint decides (survives copy/touch).
+    On a fingerprint hit the new (size, mtime_ns) is kept as "skip_sig" (and
+    journaled) so the next run short-circuits again; "sig" stays the one
+    recorded at conversion time, which is what cleanup checks before deleting.
+    """
     rec = db.get(src)
-    if not rec:
+    if not rec or not rec.get("success"):
         return False
     if not os.path.exists(dst):
         return False
     try:
-        sig = file_sig(src)
-    except FileNotFoundError:
+        sig = file_sig(src, sig_cache)
+        if sig == rec.get("sig") or sig == rec.get("skip_sig"):
+            return True
+        fp = rec.get("fp")
+        if not fp or fp != file_fingerprint(src):
+            return False
+    except OSError:
         return False
-    return rec.get("success") and rec.get("sig") == sig
+    rec["skip_sig"] = sig
+    if journal is not None:
+        journal.append(src, rec)
+    return True
+
+# Cached probe results kept in progress.json; validated against their own
+# "probe_sig" so they never affect the conversion "sig" used for skipping.
+PROBE_FIELDS = ("probe_sig", "audio_codecs", "video_codecs")
 
-def mark_progress(db, src, dst, success):
+def mark_progress(db, src, dst, success, journal=None, sig_cache=None):
     try:
-        sig = file_sig(src) if os.path.exists(src) else None
+        sig = file_sig(src, sig_cache)
+        fp = file_fingerprint(src) if success else None
     except Exception:
-        sig = None
+        sig = fp = None
+    prev = db.get(src) or {}
     db[src] = {
         "dst": dst,
         "success": bool(success),
         "sig": sig,
-        "updated_at": datetime.datetime.now().isoformat(timespec="seconds")
+        "fp": fp,
+        "updated_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        **{k: prev[k] for k in PROBE_FIELDS if k in prev}
     }
+    if journal is not None:
+        journal.append(src, db[src])
 
 # ---------- Probing (ffprobe preferred, ffmpeg stderr fallback) ----------
 AUDIO_CODEC_RE = re.compile(r"Audio:\s*([A-Za-z0-9_]+)", re.IGNORECASE)
+VIDEO_CODEC_RE = re.compile(r"Video:\s*([A-Za-z0-9_]+)", re.IGNORECASE)
 
 def ffprobe(filter_type, path):
     """
-    Return stream list filtered by 'audio' or 'video'.
-    Prefer ffprobe (JSON). If ffprobe missing, fall back to parsing `ffmpeg -i` stderr.
+    Return stream list filtered by 'audio' or 'video' (None = both).
+    Prefer PyAV (in-process), then ffprobe (JSON). If both are missing, fall back
+    to parsing `ffmpeg -i` stderr.
     """
+    if av is not None:
+        try:
+            with av.open(path, metadata_errors="ignore") as c:
+                streams = []
+                for st in c.streams:
+                    if st.type not in (filter_type or ("audio", "video")):
+                        continue
+                    codec = st.codec_context.codec
+                    # canonical_name matches ffprobe's codec_name ("mp3", not the "mp3float" decoder)
+                    name = getattr(codec, "canonical_name", None) or codec.name
+                    streams.append({"codec_type": st.type, "codec_name": name})
+                return streams
+        except Exception:
+            pass
+
     # Try ffprobe JSON first
     if FFPROBE_BIN:
         try:
@@ -165,13 +406,14 @@ def ffprobe(filter_type, path):
                 [FFPROBE_BIN, "-v", "error", "-print_format", "json",
                  "-show_streams", "-show_format", path],
                 check=True,
+                stdin=subprocess.DEVNULL,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.DEVNULL,
                 text=False
             )
             data = json.loads(res.stdout.decode("utf-8", "replace") or "{}")
             streams = data.get("streams", [])
-            return [s for s in streams if s.get("codec_type") == filter_type]
+            return [s for s in streams if s.get("codec_type") in (filter_type or ("audio", "video"))]
         except Exception:
             pass
 
@@ -179,7 +421,8 @@ def ffprobe(filter_type, path):
     try:
         # ffmpeg prints stream info to stderr
         res = subprocess.run(
-            [FFMPEG_BIN, "-hide_banner", "-v", "error", "-i", path],
+            [FFMPEG_BIN, "-hide_banner", "-nostdin", "-v", "error", "-i", path],
+            stdin=subprocess.DEVNULL,
             stdout=subprocess.DEVNULL,
             stderr=subprocess.PIPE,
             text=True,
@@ -187,114 +430,351 @@ def ffprobe(filter_type, path):
             errors="replace",
             check=False  # will "fail" because no output option; we only need stderr
         )
-        # Build a minimal structure for audio streams
+        # Build a minimal structure for audio/video streams
         streams = []
-        if filter_type == "audio":
-            for line in (res.stderr or "").splitlines():
-                m = AUDIO_CODEC_RE.search(line)
-                if m:
-                    streams.append({"codec_type": "audio", "codec_name": m.group(1).lower()})
-        elif filter_type == "video":
-            # For our current logic we only need audio probing; provide empty or basic info
-            pass
+        for line in (res.stderr or "").splitlines():
+            for kind, regex in (("audio", AUDIO_CODEC_RE), ("video", VIDEO_CODEC_RE)):
+                if filter_type in (None, kind):
+                    m = regex.search(line)
+                    if m:
+                        streams.append({"codec_type": kind, "codec_name": m.group(1).lower()})
         return streams
     except Exception:
         return []
 
-def run_ffmpeg_with_streaming(cmd, ui_queue):
-    """Run ffmpeg and stream stderr into UI/log (avoid deadlocks)."""
-    pretty = " ".join(cmd)
-    ui_safe_log(ui_queue, f"   ffmpeg: {pretty}")
+def _stderr_chunks(proc, tick=0.1):
+    """
+    Yield raw stderr chunks of `proc` until EOF; yields b"" on idle ticks so the
+    caller can flush on time. POSIX: select + non-blocking os.read. Windows pipes
+    are not selectable, so a single daemon reader thread feeds a queue instead.
+    """
+    if os.name == "posix":
+        fd = proc.stderr.fileno()
+        os.set_blocking(fd, False)
+        while True:
+            ready, _, _ = select.select([fd], [], [], tick)
+            if not ready:
+                yield b""
+                continue
+            try:
+                chunk = os.read(fd, STDERR_CHUNK)
+            except BlockingIOError:
+                continue
+            if not chunk:
+                return
+            yield chunk
+    else:
+        chunks = queue.Queue()
+
+        def reader():
+            try:
+                while True:
+                    chunk = proc.stderr.read1(STDERR_CHUNK)
+                    if not chunk:
+                        break
+                    chunks.put(chunk)
+            finally:
+                chunks.put(None)
+
+        threading.Thread(target=reader, daemon=True).start()
+        while True:
+            try:
+                chunk = chunks.get(timeout=tick)
+            except queue.Empty:
+                yield b""
+                continue
+            if chunk is None:
+                return
+            yield chunk
+
+def run_ffmpeg_with_streaming(cmd, ui_queue, verbose=True, tag=""):
+    """
+    Run ffmpeg and stream stderr into UI/log (avoid deadlocks).
+    stderr is drained continuously, but lines go to the log and the UI queue in
+    batches (every LOG_FLUSH_INTERVAL s or LOG_FLUSH_LINES lines).
+    The command line is logged up front if `verbose`, otherwise only on failure.
+    Each stderr line is prefixed with `tag` (e.g. "[3/10] ") so the output of
+    parallel conversions can be told apart.
+    """
+    if verbose:
+        ui_safe_log(ui_queue, f"   ffmpeg: {' '.join(cmd)}")
+    # stdout is DEVNULL on purpose: nothing reads it, so never add "-progress pipe:1"
+    # (or any stdout output) without also draining stdout, or a full pipe stalls ffmpeg.
     proc = subprocess.Popen(
         cmd,
+        stdin=subprocess.DEVNULL,
         stdout=subprocess.DEVNULL,
         stderr=subprocess.PIPE,
-        text=True,
-        encoding="utf-8",
-        errors="replace"
     )
-    for line in proc.stderr:
-        ui_safe_log_raw(ui_queue, f"      {line}")
+    buf = bytearray()
+    batch = []
+    last_flush = time.monotonic()
+
+    pending = ""  # UI text not yet accepted by a full queue
+
+    def flush(final=False):
+        nonlocal last_flush, pending
+        if batch:
+            joined = "".join(batch)
+            batch.clear()
+            LOG.write(joined)
+            pending += joined
+        if pending:
+            # Never stall the stderr drain on a full UI queue: coalesce and retry next tick
+            try:
+                ui_queue.put(("lograw", pending), block=final)
+                pending = ""
+            except queue.Full:
+                pass
+        last_flush = time.monotonic()
+
+    with LOG:
+        for chunk in _stderr_chunks(proc):
+            if chunk:
+                buf += chunk
+                cut = buf.rfind(b"\n")
+                if cut >= 0:
+                    text = buf[:cut + 1].decode("utf-8", "replace")
+                    del buf[:cut + 1]
+                    batch.extend(f"      {tag}{line}\n" for line in text.splitlines())
+            else:
+                # Idle tick: ffmpeg is quiet, so get buffered log text onto disk
+                LOG.flush_if_due()
+            if len(batch) >= LOG_FLUSH_LINES or time.monotonic() - last_flush >= LOG_FLUSH_INTERVAL:
+                flush()
+        if buf:
+            batch.extend(f"      {tag}{line}\n" for line in buf.decode("utf-8", "replace").splitlines())
+        flush(final=True)
     proc.stderr.close()
-    return proc.wait()
+    rc = proc.wait()
+    if rc != 0 and not verbose:
+        ui_safe_log(ui_queue, f"   ffmpeg (exit {rc}): {' '.join(cmd)}")
+    return rc
 
 def dest_path(src):
     return os.path.splitext(src)[0] + ".mp4"
 
+_INPUT_SUFFIXES = tuple(INPUT_EXTS)
+
+def _walk_inputs(root):
+    """Yield input files under `root` in os.walk order (files of a dir before its subdirs)."""
+    subdirs = []
+    try:
+        with os.scandir(root) as it:
+            for e in it:
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        subdirs.append(e.path)
+                    elif e.name.lower().endswith(_INPUT_SUFFIXES) and e.is_file():
+                        yield e.path
+                except OSError:
+                    continue
+    except OSError:
+        return
+    for d in subdirs:
+        yield from _walk_inputs(d)
+
 def collect_inputs(paths):
     found = []
     for p in paths:
-        if os.path.isfile(p) and os.path.splitext(p)[1].lower() in INPUT_EXTS:
+        if os.path.isfile(p) and p.lower().endswith(_INPUT_SUFFIXES):
             found.append(p)
         elif os.path.isdir(p):
-            for root, _, files in os.walk(p):
-                for n in files:
-                    if os.path.splitext(n)[1].lower() in INPUT_EXTS:
-                        found.append(os.path.join(root, n))
+            found.extend(_walk_inputs(p))
     # de-dupe preserving order
-    seen = set(); out = []
-    for f in found:
-        if f not in seen:
-            seen.add(f); out.append(f)
-    return out
+    return list(dict.fromkeys(found))
+
+def codecs_of(streams, kind):
+    return [(s.get("codec_name") or "").lower() for s in streams if s.get("codec_type") == kind]
+
+def cached_codecs(db, src, sig):
+    """(audio_codecs, video_codecs) cached for `src` at signature `sig`, or None."""
+    rec = db.get(src)
+    if rec and rec.get("probe_sig") == sig and "audio_codecs" in rec and "video_codecs" in rec:
+        return rec["audio_codecs"], rec["video_codecs"]
+    return None
+
+def store_codecs(db, src, sig, streams):
+    rec = db.setdefault(src, {})
+    rec["probe_sig"] = sig
+    rec["audio_codecs"] = codecs_of(streams, "audio")
+    rec["video_codecs"] = codecs_of(streams, "video")
+    return rec["audio_codecs"], rec["video_codecs"]
+
+def probe_codecs_cached(db, src, sig_cache=None, lock=None):
+    """
+    (audio, video) codec names of `src`, from progress.json if the file is unchanged, else probed.
+    `lock` guards `db`/`sig_cache` when shared between threads; it is not held while probing.
+    """
+    lock = lock or contextlib.nullcontext()
+    with lock:
+        try:
+            sig = file_sig(src, sig_cache)
+        except OSError:
+            sig = None
+        codecs = cached_codecs(db, src, sig) if sig is not None else None
+    if codecs is not None:
+        return codecs
+    streams = ffprobe(None, src)
+    if sig is None or not streams:
+        # Unreadable, or probe failed (or no A/V); don't cache it, retry next time
+        return codecs_of(streams, "audio"), codecs_of(streams, "video")
+    with lock:
+        return store_codecs(db, src, sig, streams)
+
+def probe_codecs(src, db=None, sig_cache=None, lock=None):
+    if db is not None:
+        return probe_codecs_cached(db, src, sig_cache, lock)
+    streams = ffprobe(None, src)
+    return codecs_of(streams, "audio"), codecs_of(streams, "video")
 
 # ---------- Command builders ----------
-def should_transcode_audio_for_mkv(src):
-    streams = ffprobe("audio", src)
-    if not streams:
-        return False
-    for s in streams:
-        c = (s.get("codec_name") or "").lower()
-        if c not in AUDIO_OK_FOR_MP4:
-            return True
-    return False
-
-def build_ffmpeg_cmd_remux_mkv(src, dst, transcode_audio, keep_text_subs=False):
-    cmd = [
-        FFMPEG_BIN,
-        "-loglevel", "warning",
-        "-hide_banner",
-        "-nostats",
-        "-y",
-        "-fflags", "+genpts+discardcorrupt",
-        "-err_detect", "ignore_err",
+def should_transcode_audio_for_mkv(src, db=None, sig_cache=None, lock=None):
+    audio, _ = probe_codecs(src, db, sig_cache, lock)
+    return any(c not in AUDIO_OK_FOR_MP4 for c in audio)
+
+def can_remux_to_mp4(src, db=None, sig_cache=None, lock=None):
+    """True if `src` already has MP4-ready video and audio, so a stream copy replaces the transcode."""
+    audio, video = probe_codecs(src, db, sig_cache, lock)
+    return (bool(video) and all(c in VIDEO_OK_FOR_MP4 for c in video)
+            and all(c in AUDIO_OK_FOR_MP4 for c in audio))
+
+# Arguments shared by every conversion (the log level follows the quiet option)
+_LOGLEVEL = ("-loglevel", "warning")
+_LOGLEVEL_QUIET = ("-loglevel", "fatal")
+_BASE_COMMON = (
+    "-hide_banner",
+    "-nostdin",
+    "-nostats",
+    "-y",
+    "-fflags", "+genpts+discardcorrupt",
+    "-err_detect", "ignore_err",
+)
+_TAIL = ("-avoid_negative_ts", "make_zero")
+# +faststart rewrites the whole file to move the index to the front (second write pass);
+# fragmented MP4 is written in a single pass but some players/editors seek it poorly.
+_MOVFLAGS_FASTSTART = ("-movflags", "+faststart")
+_MOVFLAGS_FRAGMENTED = ("-movflags", "+empty_moov+frag_keyframe+default_base_moof")
+
+_MAP_ALL = ("-map", "0:v?", "-map", "0:a?")
+_MAP_FIRST = ("-map", "0:v:0?", "-map", "0:a:0?")
+_AUDIO_COPY = ("-c:a", "copy")
+_AUDIO_AAC = ("-c:a", "aac", "-b:a", AUDIO_BITRATE)
+_AUDIO_AAC_RESYNC = (*_AUDIO_AAC, "-af", "aresample=async=1:first_pts=0")
+_TEXT_SUBS = ("-map", "0:s?", "-c:s", "mov_text")
+_LOSSLESS = ("-crf", "0", "-pix_fmt", "yuv420p")
+
+def build_ffmpeg_cmd_remux_mkv(src, dst, transcode_audio, keep_text_subs=False, quiet=False, fragmented=False):
+    return [
+        FFMPEG_BIN, *(_LOGLEVEL_QUIET if quiet else _LOGLEVEL), *_BASE_COMMON,
         "-i", src,
-        "-map", "0:v?",
-        "-map", "0:a?",
+        *_MAP_ALL,
         "-c:v", "copy",
+        *(_AUDIO_AAC_RESYNC if transcode_audio else _AUDIO_COPY),
+        *(_TEXT_SUBS if keep_text_subs else ()),
+        *_TAIL, *(_MOVFLAGS_FRAGMENTED if fragmented else _MOVFLAGS_FASTSTART), dst,
     ]
-    if transcode_audio:
-        cmd += ["-c:a", "aac", "-b:a", AUDIO_BITRATE, "-af", "aresample=async=1:first_pts=0"]
-    else:
-        cmd += ["-c:a", "copy"]
-    if keep_text_subs:
-        cmd += ["-map", "0:s?", "-c:s", "mov_text"]
-    cmd += ["-avoid_negative_ts", "make_zero", "-movflags", "+faststart", dst]
-    return cmd
-
-def build_ffmpeg_cmd_transcode(src, dst, crf, preset, tune, lossless):
-    cmd = [
-        FFMPEG_BIN,
-        "-loglevel", "warning",
-        "-hide_banner",
-        "-nostats",
-        "-y",
-        "-fflags", "+genpts+discardcorrupt",
-        "-err_detect", "ignore_err",
+
+def build_ffmpeg_cmd_remux_h264(src, dst, quiet=False):
+    # WEBM/OGV fast path: same streams and layout as the transcode, just copied
+    return [
+        FFMPEG_BIN, *(_LOGLEVEL_QUIET if quiet else _LOGLEVEL), *_BASE_COMMON,
         "-i", src,
-        "-map", "0:v:0?",
-        "-map", "0:a:0?",
-        "-c:v", "libx264",
+        *_MAP_FIRST,
+        "-c:v", "copy",
+        *_AUDIO_COPY,
+        *_TAIL, *_MOVFLAGS_FASTSTART, dst,
     ]
+
+# H.264 encoders for WEBM/OGV; hardware ones are listed in "auto" preference order
+HW_H264_ENCODERS = ("h264_nvenc", "h264_qsv", "h264_videotoolbox")
+H264_ENCODERS = ("libx264",) + HW_H264_ENCODERS
+_QSV_PRESETS = {"veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow"}
+
+_available_encoders = None
+
+def available_encoders():
+    """Encoder names offered by the resolved ffmpeg (`ffmpeg -encoders`, probed once)."""
+    global _available_encoders
+    if _available_encoders is None:
+        names = set()
+        if FFMPEG_BIN:
+            try:
+                res = subprocess.run(
+                    [FFMPEG_BIN, "-hide_banner", "-nostdin", "-encoders"],
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                    text=True,
+                    encoding="utf-8",
+                    errors="replace",
+                    check=False
+                )
+                # Lines look like: " V....D libx264   libx264 H.264 / AVC ..."
+                for line in res.stdout.splitlines():
+                    parts = line.split()
+                    if len(parts) >= 2 and len(parts[0]) == 6:
+                        names.add(parts[1])
+            except Exception:
+                pass
+        _available_encoders = names
+    return _available_encoders
+
+def encoder_works(encoder):
+    """True if `encoder` can encode one tiny synthetic frame (listed != usable: no GPU/driver)."""
+    try:
+        res = subprocess.run(
+            [FFMPEG_BIN, "-hide_banner", "-nostdin", "-loglevel", "error",
+             "-f", "lavfi", "-i", "color=s=64x64", "-frames:v", "1",
+             "-c:v", encoder, "-f", "null", "-"],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=30,
+            check=False
+        )
+        return res.returncode == 0
+    except Exception:
+        return False
+
+def resolve_encoder(choice):
+    if choice in ("", "auto"):
+        avail = available_encoders()
+        return next((e for e in HW_H264_ENCODERS if e in avail and encoder_works(e)), "libx264")
+    return choice
+
+def _video_args(encoder, crf, preset, tune, lossless):
+    """-c:v and rate-control arguments for `encoder` (lossless/tune always mean libx264)."""
     if lossless:
-        cmd += ["-preset", preset or "veryslow", "-crf", "0", "-pix_fmt", "yuv420p"]
-    else:
-        cmd += ["-preset", preset, "-crf", crf, "-pix_fmt", "yuv420p"]
-    if tune:
-        cmd += ["-tune", tune]
-    cmd += ["-c:a", "aac", "-b:a", AUDIO_BITRATE]
-    cmd += ["-avoid_negative_ts", "make_zero", "-movflags", "+faststart", dst]
-    return cmd
+        return ("-c:v", "libx264", "-preset", preset or "veryslow", *_LOSSLESS,
+                *(("-tune", tune) if tune else ()))
+    if encoder == "libx264":
+        return ("-c:v", "libx264", "-preset", preset, "-crf", crf, "-pix_fmt", "yuv420p",
+                *(("-tune", tune) if tune else ()))
+    if encoder == "h264_nvenc":
+        # NVENC has no CRF; constant-quality VBR with -cq takes the CRF value
+        return ("-c:v", "h264_nvenc", "-preset", "p5", "-rc", "vbr", "-cq", crf, "-b:v", "0", "-pix_fmt", "yuv420p")
+    if encoder == "h264_qsv":
+        return ("-c:v", "h264_qsv", "-preset", preset if preset in _QSV_PRESETS else "veryfast",
+                "-global_quality", crf, "-pix_fmt", "nv12")
+    if encoder == "h264_videotoolbox":
+        # VideoToolbox quality is 1..100 (higher = better); map CRF onto it
+        try:
+            q = max(1, min(100, round(100 - 2 * float(crf))))
+        except ValueError:
+            q = 64
+        return ("-c:v", "h264_videotoolbox", "-q:v", str(q), "-pix_fmt", "yuv420p")
+    raise ValueError(f"Unsupported encoder: {encoder}")
+
+def build_ffmpeg_cmd_transcode(src, dst, crf, preset, tune, lossless, quiet=False, encoder="libx264"):
+    return [
+        FFMPEG_BIN, *(_LOGLEVEL_QUIET if quiet else _LOGLEVEL), *_BASE_COMMON,
+        "-i", src,
+        *_MAP_FIRST,
+        *_video_args(encoder, crf, preset, tune, lossless),
+        *_AUDIO_AAC,
+        *_TAIL, *_MOVFLAGS_FASTSTART, dst,
+    ]
 
 # ---------- Deletion helpers ----------
 def try_send2trash(path):
@@ -319,83 +799,188 @@ class ConverterWorker(threading.Thread):
         self.tasks = tasks  # list of file paths
         self.opts = opts
         self._stop = threading.Event()
+        self.db = {}
+        self.encoder = "libx264"  # resolved from opts["encoder"] when the run starts
+        self._sig_cache = {}      # path -> file_sig for this run (sources aren't modified while converting)
+        self._done = {}           # src -> already_done() result, shared by pre-probe and dispatch
+        self._db_lock = threading.Lock()  # db is read by pool tasks (probe cache) while results are recorded
+        self.journal = ProgressJournal(PROGRESS_DB_FILE, PROGRESS_JOURNAL_FILE)
 
     def stop(self):
         self._stop.set()
 
     def run(self):
+        try:
+            with LOG, FAILED, self.journal:
+                self._run()
+        except Exception:
+            ui_safe_log(self.ui_queue, "❌ Worker crashed.")
+            ui_safe_log_raw(self.ui_queue, traceback.format_exc() + "\n")
+        finally:
+            # Always re-enable the UI, whatever happened above
+            self.ui_queue.put(("done", None))
+
+    def _run(self):
         # Start session header
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(f"\n=== Session started: {nowstamp()} ===\n")
+        LOG.write(f"\n=== Session started: {nowstamp()} ===\n")
 
         if not FFMPEG_BIN:
             ui_safe_log(self.ui_queue, "❌ FFmpeg not available. Put ffmpeg.exe beside the script or install it.")
-            self.ui_queue.put(("done", None))
             return
 
-        db = load_json(PROGRESS_DB_FILE)
+        db = self.db = self.journal.load()
+        self.preprobe(db)
+        self.encoder = resolve_encoder(self.opts["encoder"])
         total = len(self.tasks)
         success = 0
         skipped = 0
-        idx = 0
+        finished = 0
 
-        for src in self.tasks:
-            if self._stop.is_set():
-                ui_safe_log(self.ui_queue, "🛑 Stopped by user.")
-                break
-            idx += 1
-            try:
-                ext = os.path.splitext(src)[1].lower()
+        ex = ThreadPoolExecutor(max_workers=self.opts["parallelism"])
+        futs = {}
+        # dst -> [(idx, src), ...] waiting for the conversion already writing that dst
+        # (a.mkv and a.webm both become a.mp4), so one output is never written twice at once
+        held = {}
+        try:
+            for idx, src in enumerate(self.tasks, 1):
+                if self._stop.is_set():
+                    break
+                try:
+                    # Skip if already done & unchanged
+                    if not self.opts["force"] and self.is_done(src):
+                        ui_safe_log(self.ui_queue, f"[{idx}/{total}] ⏭️  Skipping (already converted & unchanged): {src}")
+                        skipped += 1
+                        finished += 1
+                        self.ui_queue.put(("progress", (finished, total)))
+                        continue
+                except Exception:
+                    self.log_crash(src)
+                    with self._db_lock:
+                        mark_progress(db, src, dest_path(src), False, self.journal, self._sig_cache)
+                    finished += 1
+                    self.ui_queue.put(("progress", (finished, total)))
+                    continue
                 dst = dest_path(src)
-
-                # Skip if already done & unchanged
-                if not self.opts["force"] and already_done(db, src, dst):
-                    ui_safe_log(self.ui_queue, f"[{idx}/{total}] ⏭️  Skipping (already converted & unchanged): {src}")
-                    skipped += 1
-                    self.ui_queue.put(("progress", (idx, total)))
+                if dst in held:
+                    held[dst].append((idx, src))
                     continue
+                held[dst] = []
+                futs[ex.submit(self.process_file, src, idx, total)] = src
+
+            # Results are recorded here, on the worker thread, as files complete
+            while futs:
+                done, _ = wait(futs, return_when=FIRST_COMPLETED)
+                if self._stop.is_set():
+                    for f in futs:
+                        f.cancel()
+                for fut in done:
+                    src = futs.pop(fut)
+                    ok = None if fut.cancelled() else fut.result()
+                    if ok is not None:
+                        if self.record_result(src, ok):
+                            success += 1
+                        finished += 1
+                        self.ui_queue.put(("progress", (finished, total)))
+                    # Its output is final now; start the next file with the same dst
+                    waiting = held[dest_path(src)]
+                    if waiting and not self._stop.is_set():
+                        nidx, nsrc = waiting.pop(0)
+                        futs[ex.submit(self.process_file, nsrc, nidx, total)] = nsrc
+        finally:
+            ex.shutdown(wait=True, cancel_futures=True)
+            with self._db_lock:
+                self.save_progress(force=True)
+
+        if self._stop.is_set():
+            ui_safe_log(self.ui_queue, "🛑 Stopped by user.")
+        ui_safe_log(self.ui_queue, f"\n✅ Done! Converted {success}/{total} successfully. Skipped {skipped}.")
+        LOG.write(f"=== Session ended: {nowstamp()} ===\n")
 
-                # Process file
-                if ext == ".mkv":
-                    ok = self.process_mkv(src, idx, total)
-                else:
-                    ok = self.process_transcode(src, idx, total)
+    def process_file(self, src, idx, total):
+        """Pool task: convert one file. Returns True/False, or None if skipped because of a stop."""
+        if self._stop.is_set():
+            return None
+        try:
+            if os.path.splitext(src)[1].lower() == ".mkv":
+                return self.process_mkv(src, idx, total)
+            return self.process_transcode(src, idx, total)
+        except Exception:
+            self.log_crash(src)
+            return False
 
-                mark_progress(db, src, dst, ok)
-                save_json(PROGRESS_DB_FILE, db)
+    def record_result(self, src, ok):
+        """Record a finished file (progress DB, optional delete-after); True if it converted."""
+        converted = False
+        try:
+            with self._db_lock:
+                mark_progress(self.db, src, dest_path(src), ok, self.journal, self._sig_cache)
+                self.save_progress()
+            if ok:
+                converted = True
+                # Optional delete-after
+                if self.opts["delete_after_policy"]:
+                    self.maybe_delete_source(src)
+        except Exception:
+            self.log_crash(src)
+            with self._db_lock:
+                mark_progress(self.db, src, dest_path(src), False, self.journal, self._sig_cache)
+        return converted
+
+    def log_crash(self, src):
+        ui_safe_log(self.ui_queue, f"❌ Crash while processing: {src}")
+        ui_safe_log_raw(self.ui_queue, traceback.format_exc() + "\n")
+        append_failed(src)
 
-                if ok:
-                    success += 1
-                    # Optional delete-after
-                    if self.opts["delete_after_policy"]:
-                        self.maybe_delete_source(src)
-            except Exception:
-                ui_safe_log(self.ui_queue, f"❌ Crash while processing: {src}")
-                ui_safe_log_raw(self.ui_queue, traceback.format_exc() + "\n")
-                append_failed(src)
-                dst = dest_path(src)
-                mark_progress(db, src, dst, False)
-                save_json(PROGRESS_DB_FILE, db)
-            finally:
-                self.ui_queue.put(("progress", (idx, total)))
+    def preprobe(self, db):
+        """Probe all uncached inputs up front, in parallel, so the encode loop hits the cache."""
+        pending = {}
+        for src in self.tasks:
+            if not self.opts["force"] and self.is_done(src):
+                continue
+            try:
+                sig = file_sig(src, self._sig_cache)
+            except OSError:
+                continue
+            if cached_codecs(db, src, sig) is None:
+                pending[src] = sig
+        if not pending:
+            return
+        ui_safe_log(self.ui_queue, f"🔎 Probing {len(pending)} file(s)...")
+        ex = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+        try:
+            futs = {ex.submit(ffprobe, None, src): src for src in pending}
+            for fut in as_completed(futs):
+                if self._stop.is_set():
+                    break
+                src = futs[fut]
+                streams = fut.result()
+                if not streams:
+                    continue
+                store_codecs(db, src, pending[src], streams)
+                self.journal.append(src, db[src])
+        finally:
+            ex.shutdown(wait=True, cancel_futures=True)
 
-        ui_safe_log(self.ui_queue, f"\n✅ Done! Converted {success}/{total} successfully. Skipped {skipped}.")
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(f"=== Session ended: {nowstamp()} ===\n")
-        self.ui_queue.put(("done", None))
+    def save_progress(self, force=False):
+        """Compact the progress journal into progress.json once it has grown enough (or `force`)."""
+        if self.journal.pending and (force or self.journal.pending >= PROGRESS_COMPACT_EVERY):
+            self.journal.compact(self.db)
 
     def process_mkv(self, src, idx, total):
+        tag = f"[{idx}/{total}] "
         ui_safe_log(self.ui_queue, f"[{idx}/{total}] 🔄 Remux (MKV): {src}")
         transcode_audio = self.should_transcode_audio_for_mkv(src)
-        cmd = build_ffmpeg_cmd_remux_mkv(src, dest_path(src), transcode_audio, keep_text_subs=False)
-        rc = run_ffmpeg_with_streaming(cmd, self.ui_queue)
-        if rc == 0 and os.path.exists(dest_path(src)) and os.path.getsize(dest_path(src)) > 0:
+        cmd = build_ffmpeg_cmd_remux_mkv(src, dest_path(src), transcode_audio, keep_text_subs=False,
+                                         quiet=self.opts["quiet"], fragmented=self.opts["fragmented"])
+        rc = run_ffmpeg_with_streaming(cmd, self.ui_queue, verbose=not self.opts["quiet"], tag=tag)
+        if rc == 0 and output_ok(dest_path(src)):
             ui_safe_log(self.ui_queue, f"✅ Success: {dest_path(src)}")
             return True
         ui_safe_log(self.ui_queue, "   ⚠️ Primary attempt failed. Trying fallback (force AAC, drop subs).")
-        cmd2 = build_ffmpeg_cmd_remux_mkv(src, dest_path(src), True, False)
-        rc2 = run_ffmpeg_with_streaming(cmd2, self.ui_queue)
-        if rc2 == 0 and os.path.exists(dest_path(src)) and os.path.getsize(dest_path(src)) > 0:
+        cmd2 = build_ffmpeg_cmd_remux_mkv(src, dest_path(src), True, False,
+                                          quiet=self.opts["quiet"], fragmented=self.opts["fragmented"])
+        rc2 = run_ffmpeg_with_streaming(cmd2, self.ui_queue, verbose=not self.opts["quiet"], tag=tag)
+        if rc2 == 0 and output_ok(dest_path(src)):
             ui_safe_log(self.ui_queue, f"✅ Success (fallback): {dest_path(src)}")
             return True
         ui_safe_log(self.ui_queue, f"❌ Failed: {src}")
@@ -403,23 +988,52 @@ class ConverterWorker(threading.Thread):
         return False
 
     def process_transcode(self, src, idx, total):
-        ui_safe_log(self.ui_queue, f"[{idx}/{total}] 🔄 Transcode: {src}")
-        cmd = build_ffmpeg_cmd_transcode(
-            src, dest_path(src),
-            self.opts["crf"], self.opts["preset"],
-            self.opts["tune"] if self.opts["tune"] else None,
-            self.opts["lossless"]
-        )
-        rc = run_ffmpeg_with_streaming(cmd, self.ui_queue)
-        if rc == 0 and os.path.exists(dest_path(src)) and os.path.getsize(dest_path(src)) > 0:
+        tag = f"[{idx}/{total}] "
+        if self.can_remux_to_mp4(src):
+            ui_safe_log(self.ui_queue, f"[{idx}/{total}] 🔄 Remux (already H.264): {src}")
+            cmd = build_ffmpeg_cmd_remux_h264(src, dest_path(src), quiet=self.opts["quiet"])
+            rc = run_ffmpeg_with_streaming(cmd, self.ui_queue, verbose=not self.opts["quiet"], tag=tag)
+            if rc == 0 and output_ok(dest_path(src)):
+                ui_safe_log(self.ui_queue, f"✅ Success: {dest_path(src)}")
+                return True
+            ui_safe_log(self.ui_queue, "   ⚠️ Remux failed. Transcoding instead.")
+        encoder = "libx264" if self.opts["lossless"] else self.encoder
+        ui_safe_log(self.ui_queue, f"[{idx}/{total}] 🔄 Transcode ({encoder}): {src}")
+        if self.transcode(src, encoder, tag):
             ui_safe_log(self.ui_queue, f"✅ Success: {dest_path(src)}")
             return True
+        if encoder != "libx264":
+            ui_safe_log(self.ui_queue, f"   ⚠️ {encoder} failed. Trying fallback (libx264).")
+            if self.transcode(src, "libx264", tag):
+                ui_safe_log(self.ui_queue, f"✅ Success (fallback): {dest_path(src)}")
+                return True
         ui_safe_log(self.ui_queue, f"❌ Failed: {src}")
         append_failed(src)
         return False
 
+    def transcode(self, src, encoder, tag=""):
+        cmd = build_ffmpeg_cmd_transcode(
+            src, dest_path(src),
+            self.opts["crf"], self.opts["preset"],
+            self.opts["tune"] if self.opts["tune"] else None,
+            self.opts["lossless"],
+            quiet=self.opts["quiet"],
+            encoder=encoder
+        )
+        rc = run_ffmpeg_with_streaming(cmd, self.ui_queue, verbose=not self.opts["quiet"], tag=tag)
+        return rc == 0 and output_ok(dest_path(src))
+
+    def is_done(self, src):
+        if src not in self._done:
+            with self._db_lock:
+                self._done[src] = already_done(self.db, src, dest_path(src), self._sig_cache, self.journal)
+        return self._done[src]
+
     def should_transcode_audio_for_mkv(self, src):
-        return should_transcode_audio_for_mkv(src)
+        return should_transcode_audio_for_mkv(src, self.db, self._sig_cache, self._db_lock)
+
+    def can_remux_to_mp4(self, src):
+        return can_remux_to_mp4(src, self.db, self._sig_cache, self._db_lock)
 
     def maybe_delete_source(self, src):
         ext = os.path.splitext(src)[1].lower()
@@ -431,11 +1045,12 @@ class ConverterWorker(threading.Thread):
             ui_safe_log(self.ui_queue, f"🧪 DRY-RUN: Would remove source: {src}")
             return
         method = delete_file(src, permanent=self.opts["permanent"])
+        self._sig_cache.pop(src, None)
         ui_safe_log(self.ui_queue, f"🧹 Removed source ({method}): {src}")
 
 # ---------- Cleanup (from progress.json) ----------
 def cleanup_from_progress(ui_queue, policy, scope_paths, permanent, dry_run):
-    db = load_json(PROGRESS_DB_FILE)
+    db = ProgressJournal(PROGRESS_DB_FILE, PROGRESS_JOURNAL_FILE).load()
     if not db:
         ui_safe_log(ui_queue, "⚠️ No progress.json found or empty; nothing to clean.")
         return
@@ -457,6 +1072,8 @@ def cleanup_from_progress(ui_queue, policy, scope_paths, permanent, dry_run):
 
     ui_safe_log(ui_queue, f"🧹 Cleanup using policy={policy}, dry_run={dry_run}, permanent={permanent}")
     for src, rec in db.items():
+        if "success" not in rec:
+            continue  # probe-only record: never converted
         try:
             ext = os.path.splitext(src)[1].lower()
             if policy != "all" and ext not in policy:
@@ -477,12 +1094,6 @@ def cleanup_from_progress(ui_queue, policy, scope_paths, permanent, dry_run):
                 missing_dst += 1
                 ui_safe_log(ui_queue, f"⏭️  Skipping (converted file missing): {src}")
                 continue
-            if not os.path.exists(src):
-                missing_src += 1
-                ui_safe_log(ui_queue, f"ℹ️  Already gone: {src}")
-                continue
-
-            saved_sig = rec.get("sig")
             try:
                 current_sig = file_sig(src)
             except FileNotFoundError:
@@ -490,6 +1101,9 @@ def cleanup_from_progress(ui_queue, policy, scope_paths, permanent, dry_run):
                 ui_safe_log(ui_queue, f"ℹ️  Already gone: {src}")
                 continue
 
+            # Deleting needs an exact (size, mtime_ns) match; the head/tail
+            # fingerprint is only trusted for skipping, never for removal.
+            saved_sig = rec.get("sig")
             if not saved_sig or saved_sig != current_sig:
                 mismatched += 1
                 ui_safe_log(ui_queue, f"⏭️  Skipping (file changed since conversion): {src}")
@@ -533,7 +1147,7 @@ class App(tk.Tk):
             pass
 
         # State
-        self.ui_queue = queue.Queue()
+        self.ui_queue = queue.Queue(maxsize=UI_QUEUE_MAX)
         self.worker = None
 
         # Top controls (file list + buttons)
@@ -562,7 +1176,17 @@ class App(tk.Tk):
         ttk.Combobox(qo, width=12, textvariable=self.var_tune,
                      values=["","film","animation","grain"]).pack(side="left", padx=(5,15))
         self.var_lossless = tk.BooleanVar(value=False)
-        ttk.Checkbutton(qo, text="Lossless (x264)", variable=self.var_lossless).pack(side="left")
+        ttk.Checkbutton(qo, text="Lossless (x264)", variable=self.var_lossless).pack(side="left", padx=(0,15))
+        ttk.Label(qo, text="Encoder:").pack(side="left")
+        self.var_encoder = tk.StringVar(value=DEFAULT_ENCODER)
+        ttk.Combobox(qo, width=16, textvariable=self.var_encoder, state="readonly",
+                     values=["auto", *H264_ENCODERS]).pack(side="left", padx=(5,0))
+
+        # MKV remux opts
+        mo = ttk.Frame(opts); mo.pack(fill="x", pady=2)
+        self.var_fragmented = tk.BooleanVar(value=False)
+        ttk.Checkbutton(mo, text="Fragmented MP4 for MKV remux", variable=self.var_fragmented).pack(side="left")
+        ttk.Label(mo, text=" (single write pass, faster for big files; some players/editors seek it poorly)").pack(side="left")
 
         # Behavior opts
         bo = ttk.Frame(opts); bo.pack(fill="x", pady=2)
@@ -571,7 +1195,12 @@ class App(tk.Tk):
         self.var_dryrun = tk.BooleanVar(value=False)
         ttk.Checkbutton(bo, text="Dry-run deletions", variable=self.var_dryrun).pack(side="left", padx=(0,15))
         self.var_perm = tk.BooleanVar(value=False)
-        ttk.Checkbutton(bo, text="Permanent delete (skip Recycle Bin)", variable=self.var_perm).pack(side="left")
+        ttk.Checkbutton(bo, text="Permanent delete (skip Recycle Bin)", variable=self.var_perm).pack(side="left", padx=(0,15))
+        self.var_quiet = tk.BooleanVar(value=False)
+        ttk.Checkbutton(bo, text="Quiet ffmpeg log (fatal errors only)", variable=self.var_quiet).pack(side="left", padx=(0,15))
+        ttk.Label(bo, text="Parallel jobs:").pack(side="left")
+        self.var_jobs = tk.StringVar(value=str(DEFAULT_PARALLELISM))
+        ttk.Spinbox(bo, width=4, from_=1, to=os.cpu_count() or 1, textvariable=self.var_jobs).pack(side="left", padx=(5,0))
 
         # Delete-after policy
         delf = ttk.Frame(opts); delf.pack(fill="x", pady=2)
@@ -597,7 +1226,7 @@ class App(tk.Tk):
 
         # Log
         lf = ttk.LabelFrame(self, text="Log"); lf.pack(fill="both", expand=True, padx=10, pady=(0,10))
-        self.text = tk.Text(lf, height=16, wrap="none")
+        self.text = tk.Text(lf, height=16, wrap="none", undo=False, autoseparators=False)
         self.text.pack(fill="both", expand=True)
         self.text.configure(state="disabled")
         # Buttons
@@ -658,14 +1287,23 @@ class App(tk.Tk):
         if not delete_after_policy:
             delete_after_policy = None
 
+        try:
+            parallelism = max(1, int(self.var_jobs.get()))
+        except ValueError:
+            parallelism = DEFAULT_PARALLELISM
+
         opts = {
             "crf": self.var_crf.get().strip() or DEFAULT_CRF,
             "preset": self.var_preset.get().strip() or DEFAULT_PRESET,
             "tune": self.var_tune.get().strip(),
             "lossless": self.var_lossless.get(),
+            "encoder": self.var_encoder.get() or DEFAULT_ENCODER,
+            "fragmented": self.var_fragmented.get(),
             "force": self.var_force.get(),
             "dry_run": self.var_dryrun.get(),
             "permanent": self.var_perm.get(),
+            "quiet": self.var_quiet.get(),
+            "parallelism": parallelism,
             "delete_after_policy": "all" if delete_after_policy == {"all"} else delete_after_policy
         }
 
@@ -684,7 +1322,7 @@ class App(tk.Tk):
     def stop(self):
         if self.worker and self.worker.is_alive():
             self.worker.stop()
-            ui_safe_log(self.ui_queue, "🛑 Stop requested...")
+            ui_safe_log(self.ui_queue, "🛑 Stop requested...", block=False)
 
     # ----- Cleanup button -----
     def cleanup_from_progress_clicked(self):
@@ -706,23 +1344,24 @@ class App(tk.Tk):
 
         # Run cleanup in a short worker to keep UI responsive
         def do_cleanup():
-            with open(LOG_FILE, "a", encoding="utf-8") as f:
-                f.write(f"\n=== Cleanup session started: {nowstamp()} ===\n")
-            cleanup_from_progress(self.ui_queue, policy, scope, permanent, dry_run)
-            with open(LOG_FILE, "a", encoding="utf-8") as f:
-                f.write(f"=== Cleanup session ended: {nowstamp()} ===\n")
+            with LOG:
+                LOG.write(f"\n=== Cleanup session started: {nowstamp()} ===\n")
+                cleanup_from_progress(self.ui_queue, policy, scope, permanent, dry_run)
+                LOG.write(f"=== Cleanup session ended: {nowstamp()} ===\n")
 
         threading.Thread(target=do_cleanup, daemon=True).start()
 
     # ----- UI event loop -----
     def poll_queue(self):
+        # Collect log text for this tick and insert it in one go
+        logs = []
         try:
-            while True:
+            for _ in range(UI_DRAIN_PER_TICK):
                 kind, payload = self.ui_queue.get_nowait()
                 if kind == "log":
-                    self.text_append(payload + "\n")
+                    logs.append(payload + "\n")
                 elif kind == "lograw":
-                    self.text_append(payload)
+                    logs.append(payload)
                 elif kind == "progress":
                     i, total = payload
                     self.progress["value"] = i
@@ -732,6 +1371,14 @@ class App(tk.Tk):
                     self.btn_stop.config(state="disabled")
         except queue.Empty:
             pass
+        if logs:
+            self.text.configure(state="normal")
+            self.text.insert("end", "".join(logs))
+            lines = int(self.text.index("end-1c").split(".")[0])
+            if lines > LOG_VIEW_MAX_LINES:
+                self.text.delete("1.0", f"{lines - LOG_VIEW_MAX_LINES + LOG_VIEW_TRIM_LINES}.0")
+            self.text.see("end")
+            self.text.configure(state="disabled")
         self.after(100, self.poll_queue)
 
     def text_configure(self, fn):
@@ -739,16 +1386,9 @@ class App(tk.Tk):
         fn()
         self.text.configure(state="disabled")
 
-    def text_append(self, s):
-        self.text.configure(state="normal")
-        self.text.insert("end", s)
-        self.text.see("end")
-        self.text.configure(state="disabled")
-
 if __name__ == "__main__":
     # Create log header once per app run
-    with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(f"\n=== App launched: {nowstamp()} ===\n")
+    LOG.write(f"\n=== App launched: {nowstamp()} ===\n")
 
     app = App()
     app.mainloop()